@@ -5,20 +5,223 @@ A Python client for connecting to Model Context Protocol servers
 
 import asyncio
 import os
-from typing import Optional
+import threading
+import time
+from typing import Any, Optional
 from contextlib import AsyncExitStack
 
+import httpx
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+
+async def warm_up_openai(client: AsyncOpenAI):
+    """Open a pooled connection to the OpenAI API ahead of the first query
+
+    Completes DNS, TCP and TLS setup while the MCP server is starting.
+    The request is not retried and gives up after 5s; failures are ignored,
+    since the first real request reports any problem.
+
+    Args:
+        client: The OpenAI client to warm up
+    """
+    try:
+        await client.with_options(max_retries=0, timeout=5.0).models.list()
+    except Exception:
+        pass
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """Create an AsyncOpenAI client backed by a pooled HTTP/2 connection
+
+    Rate limits, 5xx responses and dropped connections are retried by the
+    SDK itself, with backoff that honours Retry-After.
+
+    Returns:
+        The OpenAI client; reuse it for the lifetime of the application
+    """
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=int(os.environ.get("HTTPX_MAX_CONNECTIONS", "200")),
+            max_keepalive_connections=100,
+            keepalive_expiry=60  # Keep idle connections across user turns, not just httpx's 5s
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+    return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client, max_retries=4)
+
+
+async def ainput(prompt: str = "") -> str:
+    """Read a line from stdin without blocking the event loop
+
+    input() runs on a daemon thread rather than the default executor, so a
+    pending prompt never keeps the process alive on shutdown.
+
+    Args:
+        prompt: Prompt to print before reading
+
+    Returns:
+        The line read, without the trailing newline
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except Exception as e:
+            loop.call_soon_threadsafe(deliver, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(deliver, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+def to_openai_tools(tools) -> Optional[list[dict]]:
+    """Convert MCP tools to the OpenAI tool format
+
+    Args:
+        tools: MCP tools as returned by list_tools
+
+    Returns:
+        OpenAI tool definitions, or None when there are no tools
+    """
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": tool.inputSchema
+            }
+        }
+        for tool in tools
+    ] or None
+
+
+def tool_result_text(result) -> str:
+    """Render an MCP tool result as message content for OpenAI
+
+    Text parts are joined as-is; results without text (images, embedded
+    resources) fall back to their JSON form.
+
+    Args:
+        result: The CallToolResult returned by the MCP session
+
+    Returns:
+        The tool output as a string
+    """
+    text = "\n".join(c.text for c in result.content if c.type == "text")
+    if text:
+        return text
+    return orjson.dumps([c.model_dump(mode="json") for c in result.content]).decode()
+
+
+def trim_history(messages: list[dict], max_messages: int) -> list[dict]:
+    """Drop the oldest turns once the history grows past max_messages
+
+    The original user message and the most recent turns are kept verbatim so
+    requests share a stable prompt prefix. The kept tail never starts with a
+    tool result, so every result stays paired with the assistant tool call
+    that produced it.
+
+    Args:
+        messages: The conversation so far, as plain dicts
+        max_messages: Maximum number of messages to keep, at least 2 (the
+            original user message plus one more); 0 disables trimming
+
+    Returns:
+        The trimmed conversation
+    """
+    if max_messages <= 0:
+        return messages
+    max_messages = max(max_messages, 2)  # Room for the original message and at least one more
+    if len(messages) <= max_messages:
+        return messages
+
+    start = len(messages) - (max_messages - 1)
+    while start > 1 and messages[start]["role"] == "tool":
+        start -= 1
+    return [messages[0], *messages[start:]]
+
+
+class ToolResultCache:
+    """In-memory cache of MCP tool results keyed by tool name and arguments
+
+    Caching is on by default and applies to every tool, including ones that
+    are not idempotent; set MCP_NO_CACHE when repeat calls must reach the
+    server.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """Initialize the cache
+
+        Args:
+            ttl: Seconds a cached result stays valid; 0 disables caching
+        """
+        self.ttl = ttl
+        self._entries: dict[tuple[str, bytes], tuple[float, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ToolResultCache":
+        """Build a cache configured from MCP_TOOL_CACHE_TTL / MCP_NO_CACHE"""
+        if os.environ.get("MCP_NO_CACHE"):
+            return cls(ttl=0)
+        return cls(ttl=float(os.environ.get("MCP_TOOL_CACHE_TTL", "300")))
+
+    async def call_tool(self, session: ClientSession, tool_name: str, tool_args: dict):
+        """Call an MCP tool, reusing a cached result for identical arguments
+
+        Args:
+            session: The MCP session providing the tool
+            tool_name: Name of the tool to call
+            tool_args: Arguments for the tool
+
+        Returns:
+            The tool call result
+        """
+        if self.ttl <= 0:
+            return await session.call_tool(tool_name, tool_args)
+
+        key = (tool_name, orjson.dumps(tool_args, option=orjson.OPT_SORT_KEYS))
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        result = await session.call_tool(tool_name, tool_args)
+        if not result.isError:
+            now = time.monotonic()
+            # Drop expired entries so varied arguments cannot grow the cache without bound
+            for stale in [k for k, (stamp, _) in self._entries.items() if now - stamp >= self.ttl]:
+                del self._entries[stale]
+            self._entries[key] = (now, result)
+        return result
+
+    def clear(self):
+        """Drop all cached results"""
+        self._entries.clear()
+
 
 class MCPClient:
     def __init__(self):
         """Initialize the MCP client"""
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.client = create_openai_client()
+        self.exit_stack.push_async_callback(self.client.close)
         self.available_tools = []
+        self.openai_tools = None
+        self.tool_cache = ToolResultCache.from_env()
+        self.max_history = int(os.environ.get("MCP_MAX_HISTORY", "20"))
+        self.max_turns = int(os.environ.get("MCP_MAX_TURNS", "10"))
 
     async def connect_to_server(self, server_script_path: str):
         """Connect to an MCP server
@@ -26,6 +229,11 @@ class MCPClient:
         Args:
             server_script_path: Path to the server script
         """
+        # Warm up the OpenAI connection while the MCP server starts; nothing
+        # waits for it, and it is cancelled on cleanup if still running
+        warm_up = asyncio.create_task(warm_up_openai(self.client))
+        self.exit_stack.callback(warm_up.cancel)
+
         server_params = StdioServerParameters(
             command="python3",
             args=[server_script_path],
@@ -45,6 +253,7 @@ class MCPClient:
         # List available tools
         response = await self.session.list_tools()
         self.available_tools = response.tools
+        self.openai_tools = to_openai_tools(self.available_tools)
         print(f"\nConnected to server with {len(self.available_tools)} tools:")
         for tool in self.available_tools:
             print(f"  - {tool.name}: {tool.description}")
@@ -65,56 +274,70 @@ class MCPClient:
             }
         ]
 
-        # Convert MCP tools to OpenAI tool format
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.inputSchema
-                }
-            }
-            for tool in self.available_tools
-        ]
+        # Text from responses cut off by the token limit
+        partial = []
 
-        # Agentic loop
-        while True:
-            response = self.client.chat.completions.create(
+        # Agentic loop, bounded so a looping model cannot run forever
+        for _ in range(self.max_turns):
+            messages = trim_history(messages, self.max_history)
+            response = await self.client.chat.completions.create(
                 model="gpt-4-turbo-preview",
                 max_tokens=4096,
                 messages=messages,
-                tools=tools if tools else None
+                tools=self.openai_tools
             )
 
             response_message = response.choices[0].message
-
-            # Add assistant response to messages
-            messages.append(response_message)
-
-            # Check if we're done (no tool calls)
-            if not response_message.tool_calls:
-                return response_message.content
-
-            # Process tool calls
+            finish_reason = response.choices[0].finish_reason
+
+            # Add assistant response to messages as a plain dict so the SDK
+            # does not re-walk the pydantic model on every later request
+            messages.append(response_message.model_dump(exclude_none=True))
+
+            if finish_reason == "length":
+                # Cut off by max_tokens: keep the text and ask for the rest. A
+                # tool call cut off mid-arguments can be neither run nor answered,
+                # and an unanswered tool call makes the next request fail, so drop it
+                messages[-1].pop("tool_calls", None)
+                messages[-1]["content"] = response_message.content or ""
+                partial.append(response_message.content or "")
+                messages.append({"role": "user", "content": "Please continue."})
+                continue
+
+            if finish_reason != "tool_calls":
+                if finish_reason != "stop":
+                    print(f"\nWarning: response finished with reason '{finish_reason}'")
+                return "".join(partial) + (response_message.content or "")
+
+            # Process tool calls concurrently
+            calls = []
             for tool_call in response_message.tool_calls:
                 tool_name = tool_call.function.name
-                tool_args = eval(tool_call.function.arguments)
+                tool_args = orjson.loads(tool_call.function.arguments)
 
                 print(f"\nExecuting tool: {tool_name}")
                 print(f"Arguments: {tool_args}")
 
-                # Call the MCP tool
-                result = await self.session.call_tool(tool_name, tool_args)
+                calls.append(self.tool_cache.call_tool(self.session, tool_name, tool_args))
+
+            results = await asyncio.gather(*calls, return_exceptions=True)
+
+            # Add tool results to messages in tool_call order
+            for tool_call, result in zip(response_message.tool_calls, results):
+                if isinstance(result, Exception):
+                    content = f"Error: {result}"
+                else:
+                    content = tool_result_text(result)
 
-                # Add tool result to messages
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
-                    "name": tool_name,
-                    "content": str(result.content)
+                    "name": tool_call.function.name,
+                    "content": content
                 })
 
+        raise RuntimeError(f"No final answer after {self.max_turns} turns")
+
     async def chat_loop(self):
         """Run an interactive chat loop"""
         print("\nMCP Client Started!")
@@ -122,7 +345,7 @@ class MCPClient:
 
         while True:
             try:
-                query = input("You: ").strip()
+                query = (await ainput("You: ")).strip()
 
                 if query.lower() in ['quit', 'exit', 'q']:
                     break
@@ -133,7 +356,7 @@ class MCPClient:
                 response = await self.process_query(query)
                 print(f"\nAssistant: {response}\n")
 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 break
             except Exception as e:
                 print(f"\nError: {e}\n")
@@ -161,4 +384,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
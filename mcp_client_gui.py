@@ -4,16 +4,36 @@ A graphical user interface for the MCP client using Tkinter
 """
 
 import asyncio
+import collections
 import os
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
 from typing import Optional
 from contextlib import AsyncExitStack
-import threading
 
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from openai import OpenAI
+
+from mcp_client import (
+    ToolResultCache,
+    create_openai_client,
+    to_openai_tools,
+    tool_result_text,
+    trim_history,
+    warm_up_openai,
+)
+
+
+# Chat display lines kept before the oldest ones are trimmed
+DISPLAY_MAX_LINES = 20000
+DISPLAY_TRIM_LINES = 5000
+
+# Delay used to coalesce pending chat display updates (ms)
+DISPLAY_FLUSH_MS = 30
+
+# Interval between asyncio loop iterations driven from the Tk main loop (ms)
+ASYNC_PUMP_MS = 10
 
 
 class MCPClientGUI:
@@ -28,13 +48,22 @@ class MCPClientGUI:
         self.exit_stack = AsyncExitStack()
         self.client = None
         self.available_tools = []
+        self.openai_tools = None
+        self.tool_cache = ToolResultCache.from_env()
+        self.max_history = int(os.environ.get("MCP_MAX_HISTORY", "20"))
+        self.max_turns = int(os.environ.get("MCP_MAX_TURNS", "10"))
         self.loop = None
+        self.tasks = set()
         self.connected = False
 
+        # Chat display fragments waiting for the next flush
+        self.pending_fragments = collections.deque()
+        self.flush_scheduled = False
+
         # Setup GUI
         self.setup_gui()
 
-        # Start async loop in background thread
+        # Drive the asyncio loop from the Tk main loop
         self.start_async_loop()
 
     def setup_gui(self):
@@ -123,22 +152,61 @@ class MCPClientGUI:
         self.connect_button.pack()
 
     def start_async_loop(self):
-        """Start the asyncio event loop in a background thread"""
-        def run_loop():
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
-            self.loop.run_forever()
-
-        thread = threading.Thread(target=run_loop, daemon=True)
-        thread.start()
+        """Start the asyncio event loop on the Tk main thread"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pump_async_loop()
+
+    def pump_async_loop(self):
+        """Run one asyncio loop iteration, then hand control back to Tk
+
+        Coroutines and widgets share the main thread, so coroutines can touch
+        widgets directly without marshalling calls across threads.
+        """
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.root.after(ASYNC_PUMP_MS, self.pump_async_loop)
+
+    def run_async(self, coro):
+        """Schedule a coroutine on the asyncio loop"""
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
 
     def add_message(self, sender: str, message: str, tag: str = ""):
-        """Add a message to the chat display"""
+        """Queue a message for the chat display"""
+        if sender:
+            self.pending_fragments.append((f"{sender}: ", tag))
+        self.pending_fragments.append((f"{message}\n\n", tag if not sender else ""))
+        self.schedule_flush()
+
+    def append_stream(self, text: str, tag: str = ""):
+        """Queue a streamed fragment for the end of the chat display"""
+        self.pending_fragments.append((text, tag))
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        """Schedule a single display flush for all fragments queued meanwhile"""
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after(DISPLAY_FLUSH_MS, self.flush_messages)
+
+    def flush_messages(self):
+        """Write all queued fragments to the chat display in one pass"""
+        self.flush_scheduled = False
+        if not self.pending_fragments:
+            return
+
         self.chat_display.config(state=tk.NORMAL)
 
-        if sender:
-            self.chat_display.insert(tk.END, f"{sender}: ", tag)
-        self.chat_display.insert(tk.END, f"{message}\n\n", tag if not sender else "")
+        while self.pending_fragments:
+            text, tag = self.pending_fragments.popleft()
+            self.chat_display.insert(tk.END, text, tag)
+
+        # Keep the per-insert cost bounded by trimming the oldest lines
+        line_count = int(self.chat_display.index("end-1c").split(".")[0])
+        if line_count > DISPLAY_MAX_LINES:
+            self.chat_display.delete("1.0", f"{DISPLAY_TRIM_LINES}.0")
 
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(tk.END)
@@ -173,10 +241,7 @@ class MCPClientGUI:
         self.input_field.config(state=tk.DISABLED)
 
         # Process query asynchronously
-        asyncio.run_coroutine_threadsafe(
-            self.process_query_async(query),
-            self.loop
-        )
+        self.run_async(self.process_query_async(query))
 
     def connect_to_server(self):
         """Connect to the MCP server"""
@@ -188,24 +253,27 @@ class MCPClientGUI:
         self.add_message("", "Connecting to server...", "system")
 
         # Connect asynchronously
-        asyncio.run_coroutine_threadsafe(
-            self.connect_async(),
-            self.loop
-        )
+        self.run_async(self.connect_async())
 
     async def connect_async(self):
         """Async connection to MCP server"""
         try:
             # Check for API key
             if not os.environ.get("OPENAI_API_KEY"):
-                self.root.after(0, lambda: self.add_message(
-                    "", "Error: OPENAI_API_KEY not found in environment", "error"
-                ))
-                self.root.after(0, lambda: self.connect_button.config(state=tk.NORMAL))
+                self.add_message("", "Error: OPENAI_API_KEY not found in environment", "error")
+                self.on_connect_failed()
                 return
 
             # Initialize OpenAI client
-            self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+            if self.client is None:
+                self.client = create_openai_client()
+                self.exit_stack.push_async_callback(self.client.close)
+
+            # Warm up the OpenAI connection while the MCP server starts
+            self.run_async(warm_up_openai(self.client))
+
+            # Results from an earlier connection may not hold for this server
+            self.tool_cache.clear()
 
             # Get server script path
             server_script = os.environ.get(
@@ -233,26 +301,40 @@ class MCPClientGUI:
             # List available tools
             response = await self.session.list_tools()
             self.available_tools = response.tools
+            self.openai_tools = to_openai_tools(self.available_tools)
 
             self.connected = True
 
             # Update GUI
             tools_list = "\n".join([f"  • {tool.name}: {tool.description}" for tool in self.available_tools])
-            self.root.after(0, lambda: self.add_message(
-                "", f"✓ Connected to server!\n\nAvailable tools:\n{tools_list}", "system"
-            ))
-            self.root.after(0, lambda: self.status_label.config(
-                text=f"Status: Connected ({len(self.available_tools)} tools)",
-                fg="green"
-            ))
-            self.root.after(0, lambda: self.send_button.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.input_field.focus())
+            self.add_message("", f"✓ Connected to server!\n\nAvailable tools:\n{tools_list}", "system")
+            self.on_connected(len(self.available_tools))
 
         except Exception as e:
-            self.root.after(0, lambda: self.add_message(
-                "", f"Connection failed: {str(e)}", "error"
-            ))
-            self.root.after(0, lambda: self.connect_button.config(state=tk.NORMAL))
+            self.add_message("", f"Connection failed: {str(e)}", "error")
+            # Release whatever was opened so a retry starts from scratch
+            await self.exit_stack.aclose()
+            self.exit_stack = AsyncExitStack()
+            self.client = None
+            self.on_connect_failed()
+            return
+
+        # The stdio transport must be closed by the task that opened it, so
+        # this task holds the connection until it is cancelled on close
+        try:
+            await self.loop.create_future()
+        finally:
+            await self.exit_stack.aclose()
+
+    def on_connected(self, tool_count: int):
+        """Update the widgets once the server connection is up"""
+        self.status_label.config(text=f"Status: Connected ({tool_count} tools)", fg="green")
+        self.send_button.config(state=tk.NORMAL)
+        self.input_field.focus()
+
+    def on_connect_failed(self):
+        """Let the user retry after a failed connection"""
+        self.connect_button.config(state=tk.NORMAL)
 
     async def process_query_async(self, query: str):
         """Process a query using OpenAI and available MCP tools"""
@@ -264,80 +346,141 @@ class MCPClientGUI:
                 }
             ]
 
-            # Convert MCP tools to OpenAI tool format
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "parameters": tool.inputSchema
-                    }
-                }
-                for tool in self.available_tools
-            ]
-
-            # Agentic loop
-            while True:
-                response = self.client.chat.completions.create(
-                    model="gpt-4-turbo-preview",
-                    max_tokens=4096,
-                    messages=messages,
-                    tools=tools if tools else None
-                )
-
-                response_message = response.choices[0].message
+            # Agentic loop, bounded so a looping model cannot run forever
+            for _ in range(self.max_turns):
+                messages = trim_history(messages, self.max_history)
+                response_message, finish_reason = await self.stream_completion(messages)
 
                 # Add assistant response to messages
                 messages.append(response_message)
 
-                # Check if we're done (no tool calls)
-                if not response_message.tool_calls:
-                    self.root.after(0, lambda: self.add_message(
-                        "Assistant", response_message.content, "assistant"
-                    ))
+                if finish_reason == "length":
+                    # Cut off by max_tokens: ask for the rest. A tool call cut off
+                    # mid-arguments can be neither run nor answered, and an
+                    # unanswered tool call makes the next request fail, so drop it
+                    response_message.pop("tool_calls", None)
+                    response_message["content"] = response_message["content"] or ""
+                    messages.append({"role": "user", "content": "Please continue."})
+                    continue
+
+                if finish_reason != "tool_calls":
+                    if finish_reason != "stop":
+                        self.add_message("", f"Response finished with reason '{finish_reason}'", "system")
                     break
 
-                # Process tool calls
-                for tool_call in response_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = eval(tool_call.function.arguments)
-
-                    self.root.after(0, lambda n=tool_name, a=tool_args: self.add_message(
-                        "", f"🔧 Executing tool: {n}\nArguments: {a}", "system"
+                # Parse every call's arguments before starting any, so a
+                # malformed one cannot leave earlier calls running unawaited
+                parsed = [
+                    (tool_call["function"]["name"], orjson.loads(tool_call["function"]["arguments"]))
+                    for tool_call in response_message["tool_calls"]
+                ]
+
+                # Process tool calls concurrently; each MCP call starts right
+                # away and its notification renders while the call is in flight
+                calls = []
+                for tool_name, tool_args in parsed:
+                    calls.append(asyncio.create_task(
+                        self.tool_cache.call_tool(self.session, tool_name, tool_args)
                     ))
+                    self.add_message("", f"🔧 Executing tool: {tool_name}\nArguments: {tool_args}", "system")
+
+                results = await asyncio.gather(*calls, return_exceptions=True)
 
-                    # Call the MCP tool
-                    result = await self.session.call_tool(tool_name, tool_args)
+                # Add tool results to messages in tool_call order
+                for tool_call, result in zip(response_message["tool_calls"], results):
+                    if isinstance(result, Exception):
+                        content = f"Error: {result}"
+                    else:
+                        content = tool_result_text(result)
 
-                    # Add tool result to messages
                     messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
-                        "content": str(result.content)
+                        "tool_call_id": tool_call["id"],
+                        "name": tool_call["function"]["name"],
+                        "content": content
                     })
 
+            else:
+                self.add_message("", f"Stopped: no final answer after {self.max_turns} turns", "error")
+
         except Exception as e:
-            self.root.after(0, lambda: self.add_message(
-                "", f"Error: {str(e)}", "error"
-            ))
+            self.add_message("", f"Error: {str(e)}", "error")
 
         finally:
-            # Re-enable input
-            self.root.after(0, lambda: self.send_button.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.input_field.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.input_field.focus())
+            self.on_query_done()
+
+    def on_query_done(self):
+        """Re-enable input once a query has finished"""
+        self.send_button.config(state=tk.NORMAL)
+        self.input_field.config(state=tk.NORMAL)
+        self.input_field.focus()
+
+    async def stream_completion(self, messages: list) -> tuple[dict, Optional[str]]:
+        """Stream one chat completion into the chat display
+
+        Content deltas are appended to the display as they arrive; tool call
+        fragments are accumulated per index until the stream finishes.
+
+        Args:
+            messages: The conversation so far
+
+        Returns:
+            The complete assistant message and the finish reason
+        """
+        content = []
+        tool_calls = {}
+        finish_reason = None
+
+        stream = await self.client.chat.completions.create(
+            model="gpt-4-turbo-preview",
+            max_tokens=4096,
+            messages=messages,
+            tools=self.openai_tools,
+            stream=True
+        )
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+
+            if delta.content:
+                if not content:
+                    self.append_stream("Assistant: ", "assistant")
+                content.append(delta.content)
+                self.append_stream(delta.content)
+
+            for fragment in delta.tool_calls or []:
+                call = tool_calls.setdefault(fragment.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+
+        if content:
+            self.append_stream("\n\n")
+
+        message = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+        return message, finish_reason
 
     def on_closing(self):
         """Handle window closing"""
-        if self.connected:
-            asyncio.run_coroutine_threadsafe(
-                self.exit_stack.aclose(),
-                self.loop
-            )
-        if self.loop:
-            self.loop.call_soon_threadsafe(self.loop.stop)
+        # The loop only runs inside pump_async_loop, so it is idle here and
+        # cleanup can run to completion before the window goes away
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.run_until_complete(self.exit_stack.aclose())
+        self.loop.close()
         self.root.destroy()
 
 
@@ -1,87 +1,167 @@
 """
 MCP Client Web GUI Implementation
-A web-based interface for the MCP client using Flask
+A web-based interface for the MCP client using Quart
 """
 
 import asyncio
+import datetime
+import itertools
 import os
-from typing import Optional
+import signal
+from collections import deque
+from typing import NamedTuple, Optional
 from contextlib import AsyncExitStack
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
-import threading
+
+import orjson
+from hypercorn.asyncio import serve
+from hypercorn.config import Config as HypercornConfig
+from quart import Quart, make_response, render_template, request
+from quart_cors import cors
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
 
 from mcp import ClientSession, StdioServerParameters
+from pydantic import BaseModel, ValidationError
 from mcp.client.stdio import stdio_client
-from openai import OpenAI
 
-app = Flask(__name__)
-CORS(app)
+from mcp_client import create_openai_client, to_openai_tools, tool_result_text
+
+app = cors(Quart(__name__))
+
+class LogEntry(NamedTuple):
+    """A log entry, encoded once when logged so serving logs only copies bytes"""
+    id: int
+    json: bytes  # The entry as sent by /logs and /logs/stream
+
 
 # Global MCP client state
 class MCPClientState:
     def __init__(self):
-        self.servers = {}  # server_name -> {session, exit_stack, tools}
+        self.servers = {}  # server_name -> {session, stop, task, tools, openai_tools}
         self.client = None
         self.available_tools = []  # Combined tools from all servers
+        self.openai_tools = None  # available_tools in OpenAI format
+        self.tool_by_name = {}  # tool name -> tool
         self.connected_servers = []
-        self.loop = None
-        self.chat_history = []
-        self.logs = []
-        self.server_configs = []  # List of configured servers
+        self.chat_history = deque(maxlen=int(os.environ.get('MCP_CHAT_HISTORY_MAX', '1000')))  # Oldest messages drop first
+        self.logs = deque(maxlen=int(os.environ.get('MCP_LOG_MAX', '10000')))  # Oldest entries drop first
+        self.log_subscribers = set()  # Queues of clients streaming /logs/stream
+        self.last_log_id = 0  # Id of the newest log entry; ids increase by one per entry
+        self.server_configs = {}  # server_name -> configuration
+        self.log_level = os.environ.get('MCP_LOG_LEVEL', 'debug').lower()  # 'info' skips OpenAI payloads
+        self.mu = asyncio.Lock()  # Guards connect/disconnect changes to the server tables
+        self.max_turns = int(os.environ.get('MCP_MAX_TURNS', '10'))  # OpenAI round-trips per query
+        self.history_json = None  # Encoded /history body; reset when a message is added
+        self.status_json = (None, b'')  # (state it encodes, encoded /status body)
+
+    def add_history(self, role: str, content: str):
+        """Add a chat message to the history"""
+        self.chat_history.append({'role': role, 'content': content})
+        self.history_json = None
 
     def add_log(self, log_type: str, message: str, data: any = None):
         """Add a log entry"""
-        import datetime
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
+        self.last_log_id += 1
+        log_entry = LogEntry(self.last_log_id, orjson.dumps({
+            'id': self.last_log_id,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc),  # Entries are encoded here, so format now too
             'type': log_type,
             'message': message,
             'data': data
-        }
+        }, option=orjson.OPT_UTC_Z, default=str))  # str() anything orjson cannot encode rather than fail the caller
         self.logs.append(log_entry)
 
+        for queue in self.log_subscribers:
+            try:
+                queue.put_nowait(log_entry)
+            except asyncio.QueueFull:
+                pass  # Slow client; it misses entries rather than stalling logging
+
+    def close_log_streams(self):
+        """End every open /logs/stream response"""
+        for queue in self.log_subscribers:
+            if queue.full():
+                queue.get_nowait()  # Make room; the stream is ending anyway
+            queue.put_nowait(None)
+
+    def logs_since(self, since: int) -> list[LogEntry]:
+        """Log entries with an id greater than since, oldest first"""
+        if not self.logs:
+            return []
+        # Ids are consecutive, so the first newer entry sits at a known offset
+        start = max(0, since - self.logs[0].id + 1)
+        return list(itertools.islice(self.logs, start, None))
+
 state = MCPClientState()
 
 
-def start_async_loop():
-    """Start asyncio event loop in background thread"""
-    state.loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(state.loop)
-    state.loop.run_forever()
+def log_preview(content) -> str:
+    """Truncate message content to 500 characters for logging"""
+    if isinstance(content, str):
+        return content[:500]
+    return str(content)[:500]
+
+
+def ojsonify(obj):
+    """Build a JSON response encoded with orjson"""
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_UTC_Z), mimetype='application/json')
+
+
+# Request bodies, validated as they are parsed
+class ServerAddRequest(BaseModel):
+    name: str = ''
+    command: str = ''
+    args: list[str] = []
 
 
-# Start async loop
-thread = threading.Thread(target=start_async_loop, daemon=True)
-thread.start()
+class ServerNameRequest(BaseModel):
+    name: str = ''
+
+
+class SendRequest(BaseModel):
+    message: str = ''
+
+
+async def parse_body(model: type[BaseModel]) -> BaseModel:
+    """Parse the JSON request body straight into the given model"""
+    return model.model_validate_json(await request.get_data())
+
+
+@app.errorhandler(ValidationError)
+async def invalid_request(error: ValidationError):
+    """Reject request bodies that do not match their model"""
+    return ojsonify({'status': 'error', 'message': f'Invalid request: {error}'}), 400
 
 
 @app.route('/')
-def index():
+async def index():
     """Render main page"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
 
 @app.route('/servers', methods=['GET'])
-def get_servers():
+async def get_servers():
     """Get list of configured servers"""
-    return jsonify({'servers': state.server_configs})
+    return ojsonify({'servers': list(state.server_configs.values())})
 
 
 @app.route('/servers/add', methods=['POST'])
-def add_server():
+async def add_server():
     """Add a new MCP server configuration"""
-    data = request.json
-    server_name = data.get('name')
-    server_command = data.get('command')
-    server_args = data.get('args', [])
+    data = await parse_body(ServerAddRequest)
+    server_name = data.name
+    server_command = data.command
+    server_args = data.args
 
     if not server_name or not server_command:
-        return jsonify({'status': 'error', 'message': 'Name and command are required'})
+        return ojsonify({'status': 'error', 'message': 'Name and command are required'})
 
     # Check if server already exists
-    if any(s['name'] == server_name for s in state.server_configs):
-        return jsonify({'status': 'error', 'message': 'Server with this name already exists'})
+    if server_name in state.server_configs:
+        return ojsonify({'status': 'error', 'message': 'Server with this name already exists'})
 
     server_config = {
         'name': server_name,
@@ -90,79 +170,100 @@ def add_server():
         'connected': False
     }
 
-    state.server_configs.append(server_config)
+    state.server_configs[server_name] = server_config
     state.add_log('system', f'Added server configuration: {server_name}', server_config)
 
-    return jsonify({'status': 'success', 'message': f'Server {server_name} added'})
+    return ojsonify({'status': 'success', 'message': f'Server {server_name} added'})
 
 
 @app.route('/servers/remove', methods=['POST'])
-def remove_server():
+async def remove_server():
     """Remove a server configuration"""
-    data = request.json
-    server_name = data.get('name')
+    server_name = (await parse_body(ServerNameRequest)).name
 
-    state.server_configs = [s for s in state.server_configs if s['name'] != server_name]
+    state.server_configs.pop(server_name, None)
 
     # Disconnect if connected
     if server_name in state.servers:
-        future = asyncio.run_coroutine_threadsafe(
-            disconnect_server_async(server_name), state.loop
-        )
-        future.result(timeout=5)
+        await asyncio.wait_for(disconnect_server_async(server_name), timeout=5)
 
     state.add_log('system', f'Removed server configuration: {server_name}')
-    return jsonify({'status': 'success', 'message': f'Server {server_name} removed'})
+    return ojsonify({'status': 'success', 'message': f'Server {server_name} removed'})
 
 
 @app.route('/servers/connect', methods=['POST'])
-def connect_server():
+async def connect_server():
     """Connect to a specific MCP server"""
-    data = request.json
-    server_name = data.get('name')
+    server_name = (await parse_body(ServerNameRequest)).name
 
     if not server_name:
-        return jsonify({'status': 'error', 'message': 'Server name is required'})
+        return ojsonify({'status': 'error', 'message': 'Server name is required'})
 
-    server_config = next((s for s in state.server_configs if s['name'] == server_name), None)
+    server_config = state.server_configs.get(server_name)
     if not server_config:
-        return jsonify({'status': 'error', 'message': 'Server not found'})
+        return ojsonify({'status': 'error', 'message': 'Server not found'})
 
-    future = asyncio.run_coroutine_threadsafe(
-        connect_server_async(server_config), state.loop
-    )
     try:
-        result = future.result(timeout=10)
-        return jsonify(result)
+        result = await asyncio.wait_for(connect_server_async(server_config), timeout=10)
+        return ojsonify(result)
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return ojsonify({'status': 'error', 'message': str(e)})
 
 
 @app.route('/servers/disconnect', methods=['POST'])
-def disconnect_server():
+async def disconnect_server():
     """Disconnect from a specific server"""
-    data = request.json
-    server_name = data.get('name')
+    server_name = (await parse_body(ServerNameRequest)).name
 
-    future = asyncio.run_coroutine_threadsafe(
-        disconnect_server_async(server_name), state.loop
-    )
     try:
-        result = future.result(timeout=5)
-        return jsonify(result)
+        result = await asyncio.wait_for(disconnect_server_async(server_name), timeout=5)
+        return ojsonify(result)
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return ojsonify({'status': 'error', 'message': str(e)})
 
 
 @app.route('/connect', methods=['POST'])
-def connect():
+async def connect():
     """Connect to all configured MCP servers"""
-    future = asyncio.run_coroutine_threadsafe(connect_all_async(), state.loop)
     try:
-        result = future.result(timeout=30)
-        return jsonify(result)
+        result = await asyncio.wait_for(connect_all_async(), timeout=30)
+        return ojsonify(result)
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return ojsonify({'status': 'error', 'message': str(e)})
+
+
+async def run_server_session(server_config: dict, ready: asyncio.Future, stop: asyncio.Event):
+    """Open a server's MCP session, hand it over through ready, and hold it until stop is set
+
+    The stdio transport has to be closed by the task that opened it, so every
+    server gets a task of its own that outlives the request that connected it.
+    """
+    async with AsyncExitStack() as exit_stack:
+        try:
+            # Connect to MCP server
+            server_params = StdioServerParameters(
+                command=server_config['command'],
+                args=server_config['args'],
+                env=None
+            )
+
+            stdio_transport = await exit_stack.enter_async_context(
+                stdio_client(server_params)
+            )
+            stdio, write = stdio_transport
+            session = await exit_stack.enter_async_context(
+                ClientSession(stdio, write)
+            )
+
+            await session.initialize()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            return
+
+        if not ready.done():
+            ready.set_result(session)
+        await stop.wait()
 
 
 async def connect_server_async(server_config: dict):
@@ -171,61 +272,64 @@ async def connect_server_async(server_config: dict):
         server_name = server_config['name']
         state.add_log('system', f'Connecting to server: {server_name}')
 
-        # Create exit stack for this server
-        exit_stack = AsyncExitStack()
-
-        # Connect to MCP server
-        server_params = StdioServerParameters(
-            command=server_config['command'],
-            args=server_config['args'],
-            env=None
-        )
-
-        stdio_transport = await exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        stdio, write = stdio_transport
-        session = await exit_stack.enter_async_context(
-            ClientSession(stdio, write)
-        )
-
-        await session.initialize()
-        state.add_log('mcp_server', f'{server_name}: Session initialized')
-
-        # List available tools
-        response = await session.list_tools()
-        tools = response.tools
-
-        # Log complete tool schemas
-        tools_with_schemas = [
-            {
-                'name': tool.name,
-                'description': tool.description,
-                'inputSchema': tool.inputSchema,
-                'server': server_name
-            } for tool in tools
-        ]
-        state.add_log('mcp_server', f'{server_name}: Received {len(tools)} tools',
-                     {'tools': tools_with_schemas})
-
-        # Store server info
-        state.servers[server_name] = {
-            'session': session,
-            'exit_stack': exit_stack,
-            'tools': tools,
-            'config': server_config
-        }
+        ready = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+        task = asyncio.create_task(run_server_session(server_config, ready, stop))
+
+        # Until the server is registered, nothing else can stop its task, so
+        # any failure or cancellation (e.g. a route's wait_for timing out
+        # while waiting for the lock) must stop it here
+        try:
+            session = await ready
+            state.add_log('mcp_server', f'{server_name}: Session initialized')
+
+            # List available tools
+            response = await session.list_tools()
+            tools = response.tools
+
+            # Log complete tool schemas
+            tools_with_schemas = [
+                {
+                    'name': tool.name,
+                    'description': tool.description,
+                    'inputSchema': tool.inputSchema,
+                    'server': server_name
+                } for tool in tools
+            ]
+            state.add_log('mcp_server', f'{server_name}: Received {len(tools)} tools',
+                         {'tools': tools_with_schemas})
+
+            async with state.mu:
+                if server_name in state.servers:
+                    # Another request connected this server while we were starting it
+                    stop.set()
+                    await task
+                    return {'status': 'error', 'message': f'{server_name} is already connected'}
+
+                # Store server info
+                state.servers[server_name] = {
+                    'session': session,
+                    'stop': stop,
+                    'task': task,
+                    'tools': tools,
+                    'openai_tools': to_openai_tools(tools) or [],  # Converted once per connection
+                    'config': server_config
+                }
 
-        # Update server config status
-        for config in state.server_configs:
-            if config['name'] == server_name:
-                config['connected'] = True
+                # Update server config status
+                if server_name in state.server_configs:
+                    state.server_configs[server_name]['connected'] = True
 
-        if server_name not in state.connected_servers:
-            state.connected_servers.append(server_name)
+                if server_name not in state.connected_servers:
+                    state.connected_servers.append(server_name)
 
-        # Rebuild combined tools list
-        rebuild_tools_list()
+                # Rebuild combined tools list
+                rebuild_tools_list()
+        except BaseException:
+            # Cancel rather than signal stop: the session may still be starting
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise
 
         return {
             'status': 'success',
@@ -242,25 +346,28 @@ async def connect_server_async(server_config: dict):
 async def disconnect_server_async(server_name: str):
     """Disconnect from a specific server"""
     try:
-        if server_name in state.servers:
-            await state.servers[server_name]['exit_stack'].aclose()
-            del state.servers[server_name]
+        async with state.mu:
+            if server_name not in state.servers:
+                return {'status': 'error', 'message': 'Server not connected'}
+
+            server = state.servers.pop(server_name)
 
             if server_name in state.connected_servers:
                 state.connected_servers.remove(server_name)
 
             # Update server config status
-            for config in state.server_configs:
-                if config['name'] == server_name:
-                    config['connected'] = False
+            if server_name in state.server_configs:
+                state.server_configs[server_name]['connected'] = False
 
             # Rebuild combined tools list
             rebuild_tools_list()
 
-            state.add_log('system', f'Disconnected from {server_name}')
-            return {'status': 'success', 'message': f'Disconnected from {server_name}'}
-        else:
-            return {'status': 'error', 'message': 'Server not connected'}
+            # Let the server's own task close its session
+            server['stop'].set()
+            await server['task']
+
+        state.add_log('system', f'Disconnected from {server_name}')
+        return {'status': 'success', 'message': f'Disconnected from {server_name}'}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
 
@@ -273,10 +380,7 @@ async def connect_all_async():
             state.add_log('error', 'OPENAI_API_KEY not found in environment')
             return {'status': 'error', 'message': 'OPENAI_API_KEY not found in environment'}
 
-        # Initialize OpenAI client if not already done
-        if not state.client:
-            state.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            state.add_log('system', 'OpenAI client initialized')
+        get_openai_client()
 
         # If no servers configured, add default
         if not state.server_configs:
@@ -287,14 +391,15 @@ async def connect_all_async():
                         "/Users/veeravelmanivannan/AI_projects/mcp_client/mcp_server.py")],
                 'connected': False
             }
-            state.server_configs.append(default_server)
-
-        # Connect to all servers
-        results = []
-        for server_config in state.server_configs:
-            if not server_config['connected']:
-                result = await connect_server_async(server_config)
-                results.append(result)
+            state.server_configs['default'] = default_server
+
+        # Connect to all servers concurrently
+        await asyncio.gather(
+            *(connect_server_async(server_config)
+              for server_config in state.server_configs.values()
+              if not server_config['connected']),
+            return_exceptions=True
+        )
 
         state.add_log('system', f'Connected to {len(state.connected_servers)} servers')
 
@@ -310,37 +415,49 @@ async def connect_all_async():
         return {'status': 'error', 'message': str(e)}
 
 
+def get_openai_client():
+    """Return the OpenAI client shared by every query, creating it on first use"""
+    if state.client is None:
+        # Async client on one pooled HTTP/2 connection set
+        state.client = create_openai_client()
+        state.add_log('system', 'OpenAI client initialized')
+    return state.client
+
+
 def rebuild_tools_list():
     """Rebuild the combined tools list from all connected servers"""
     state.available_tools = []
+    openai_tools = []
     for server_name, server_info in state.servers.items():
         # Add server name to each tool for tracking
         for tool in server_info['tools']:
             tool.server_name = server_name  # Track which server provides this tool
             state.available_tools.append(tool)
+        openai_tools.extend(server_info['openai_tools'])
+
+    state.openai_tools = openai_tools or None
+    state.tool_by_name = {tool.name: tool for tool in state.available_tools}
 
 
 @app.route('/send', methods=['POST'])
-def send_message():
+async def send_message():
     """Send a message and get response"""
     if len(state.connected_servers) == 0:
-        return jsonify({'status': 'error', 'message': 'Not connected to any server'})
+        return ojsonify({'status': 'error', 'message': 'Not connected to any server'})
 
-    data = request.json
-    query = data.get('message', '')
+    query = (await parse_body(SendRequest)).message
 
     if not query:
-        return jsonify({'status': 'error', 'message': 'Empty message'})
+        return ojsonify({'status': 'error', 'message': 'Empty message'})
 
     # Add user message to history
-    state.chat_history.append({'role': 'user', 'content': query})
+    state.add_history('user', query)
 
-    future = asyncio.run_coroutine_threadsafe(process_query_async(query), state.loop)
     try:
-        result = future.result(timeout=60)
-        return jsonify(result)
+        result = await asyncio.wait_for(process_query_async(query), timeout=60)
+        return ojsonify(result)
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return ojsonify({'status': 'error', 'message': str(e)})
 
 
 async def process_query_async(query: str):
@@ -355,74 +472,73 @@ async def process_query_async(query: str):
             }
         ]
 
-        # Convert MCP tools to OpenAI tool format
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.inputSchema
-                }
-            }
-            for tool in state.available_tools
-        ]
-
-        # Log the tool schemas that will be sent to OpenAI
-        state.add_log('system', 'Tool schemas available for OpenAI',
-                     {'tools': tools})
+        tools = state.openai_tools
 
         tool_executions = []
 
-        # Agentic loop
-        loop_count = 0
-        while True:
-            loop_count += 1
+        # Number of messages already shown in an earlier request log
+        logged_count = 0
+
+        # (tool name, sorted JSON arguments) of every tool call made for this query
+        seen_calls = set()
+
+        # Agentic loop, bounded so a looping model cannot run forever
+        for loop_count in range(1, state.max_turns + 1):
 
             # Log full request with complete tool schemas
-            request_data = {
-                'model': 'gpt-4-turbo-preview',
-                'messages': [
-                    {
-                        'role': msg.get('role') if isinstance(msg, dict) else getattr(msg, 'role', 'unknown'),
-                        'content': str(msg.get('content') if isinstance(msg, dict) else getattr(msg, 'content', ''))[:500]
-                    } for msg in messages
-                ],
-                'tools': tools if tools else []  # Include complete tool schemas
-            }
+            request_data = None
+            if state.log_level == 'debug':
+                request_data = {
+                    'model': 'gpt-4-turbo-preview',
+                    'message_count': len(messages),
+                    # Only the messages added since the previous request; earlier
+                    # ones are in that request's log entry
+                    'messages': [
+                        {
+                            'role': msg['role'],
+                            'content': log_preview(msg.get('content') or '')
+                        } for msg in messages[logged_count:]
+                    ],
+                    # Complete tool schemas; they do not change within a query,
+                    # so later iterations only name the tools
+                    'tools': (tools or []) if loop_count == 1 else [t['function']['name'] for t in tools or []]
+                }
             state.add_log('openai', f'📤 Request to OpenAI (iteration {loop_count})', request_data)
+            logged_count = len(messages)
 
-            response = state.client.chat.completions.create(
+            response = await get_openai_client().chat.completions.create(
                 model="gpt-4-turbo-preview",
                 max_tokens=4096,
                 messages=messages,
-                tools=tools if tools else None
+                tools=tools
             )
 
             response_message = response.choices[0].message
 
             # Log full response
-            response_data = {
-                'role': 'assistant',
-                'content': response_message.content,
-                'tool_calls': [
-                    {
-                        'id': tc.id,
-                        'name': tc.function.name,
-                        'arguments': tc.function.arguments
-                    } for tc in response_message.tool_calls
-                ] if response_message.tool_calls else None,
-                'finish_reason': response.choices[0].finish_reason
-            }
+            response_data = None
+            if state.log_level == 'debug':
+                response_data = {
+                    'role': 'assistant',
+                    'content': response_message.content,
+                    'tool_calls': [
+                        {
+                            'id': tc.id,
+                            'name': tc.function.name,
+                            'arguments': tc.function.arguments
+                        } for tc in response_message.tool_calls
+                    ] if response_message.tool_calls else None,
+                    'finish_reason': response.choices[0].finish_reason
+                }
             state.add_log('openai', f'📥 Response from OpenAI', response_data)
 
-            # Add assistant response to messages
-            messages.append(response_message)
+            # Add assistant response to messages as a plain dict, as the CLI does
+            messages.append(response_message.model_dump(exclude_none=True))
 
             # Check if we're done (no tool calls)
             if not response_message.tool_calls:
                 # Add to chat history
-                state.chat_history.append({'role': 'assistant', 'content': response_message.content})
+                state.add_history('assistant', response_message.content)
                 state.add_log('system', 'Query processing completed')
 
                 return {
@@ -431,103 +547,236 @@ async def process_query_async(query: str):
                     'tool_executions': tool_executions
                 }
 
-            # Process tool calls
+            # Process tool calls concurrently
+            calls = []
+            call_keys = []  # seen_calls key of each call, None for skipped repeats
             for tool_call in response_message.tool_calls:
                 tool_name = tool_call.function.name
-                tool_args = eval(tool_call.function.arguments)
+                tool_args = orjson.loads(tool_call.function.arguments)
 
                 state.add_log('openai', f'🔧 OpenAI requesting tool execution: {tool_name}',
                              {'tool_call_id': tool_call.id, 'arguments': tool_args})
 
+                key = (tool_name, orjson.dumps(tool_args, option=orjson.OPT_SORT_KEYS))
+                if key in seen_calls:
+                    # Point the model at the earlier result instead of running the tool again
+                    state.add_log('system', f'Skipped repeated call to {tool_name}', {'arguments': tool_args})
+                    calls.append(asyncio.sleep(0, result=(
+                        f"{tool_name} was already called with these arguments; use the previous result."
+                    )))
+                    call_keys.append(None)
+                    continue
+                seen_calls.add(key)
+                call_keys.append(key)
+
                 tool_executions.append({
                     'name': tool_name,
                     'arguments': tool_args
                 })
 
-                # Find which server provides this tool
-                tool_obj = next((t for t in state.available_tools if t.name == tool_name), None)
-                if not tool_obj:
-                    error_msg = f"Tool {tool_name} not found in any connected server"
-                    state.add_log('error', error_msg)
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
-                        "content": error_msg
-                    })
-                    continue
-
-                server_name = tool_obj.server_name
-                server_session = state.servers[server_name]['session']
+                calls.append(call_tool_async(tool_name, tool_args))
 
-                # Call the MCP tool on the correct server
-                mcp_request = {
-                    'tool': tool_name,
-                    'arguments': tool_args,
-                    'server': server_name
-                }
-                state.add_log('mcp_client', f'📤 Sending tool request to {server_name}: {tool_name}', mcp_request)
+            results = await asyncio.gather(*calls, return_exceptions=True)
 
-                result = await server_session.call_tool(tool_name, tool_args)
-
-                mcp_response = {
-                    'tool': tool_name,
-                    'server': server_name,
-                    'result': str(result.content),
-                    'content_type': type(result.content).__name__
-                }
-                state.add_log('mcp_server', f'📥 {server_name} tool execution complete: {tool_name}', mcp_response)
+            # Add tool results to messages in tool_call order
+            for tool_call, key, content in zip(response_message.tool_calls, call_keys, results):
+                if isinstance(content, Exception):
+                    seen_calls.discard(key)  # A failed call may be retried with the same arguments
+                    content = f"Error: {content}"
+                    state.add_log('error', f'Tool {tool_call.function.name} failed: {content}')
 
-                # Add tool result to messages
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
-                    "name": tool_name,
-                    "content": str(result.content)
+                    "name": tool_call.function.name,
+                    "content": content
                 })
 
+        state.add_log('error', f'No final answer after {state.max_turns} iterations')
+        return {
+            'status': 'error',
+            'message': f'No final answer after {state.max_turns} iterations',
+            'tool_executions': tool_executions
+        }
+
     except Exception as e:
         state.add_log('error', f'Error in query processing: {str(e)}')
         return {'status': 'error', 'message': str(e)}
 
 
+async def call_tool_async(tool_name: str, tool_args: dict) -> str:
+    """Call a tool on the server that provides it; raises RuntimeError if the tool reports an error"""
+    # Find which server provides this tool
+    tool_obj = state.tool_by_name.get(tool_name)
+    if not tool_obj:
+        error_msg = f"Tool {tool_name} not found in any connected server"
+        state.add_log('error', error_msg)
+        return error_msg
+
+    server_name = tool_obj.server_name
+    server_session = state.servers[server_name]['session']
+
+    # Call the MCP tool on the correct server
+    mcp_request = {
+        'tool': tool_name,
+        'arguments': tool_args,
+        'server': server_name
+    }
+    state.add_log('mcp_client', f'📤 Sending tool request to {server_name}: {tool_name}', mcp_request)
+
+    result = await server_session.call_tool(tool_name, tool_args)
+    content = tool_result_text(result)
+
+    mcp_response = {
+        'tool': tool_name,
+        'server': server_name,
+        'result': content,
+        'content_type': type(result.content).__name__,
+        'is_error': result.isError
+    }
+    state.add_log('mcp_server', f'📥 {server_name} tool execution complete: {tool_name}', mcp_response)
+
+    if result.isError:
+        # Raise so the caller treats it like any other failed call
+        raise RuntimeError(content)
+    return content
+
+
+@app.after_serving
+async def shutdown():
+    """Close every server session and the OpenAI client when the app stops"""
+    await asyncio.gather(*(disconnect_server_async(name) for name in list(state.servers)))
+    if state.client:
+        await state.client.close()
+
+
 @app.route('/history', methods=['GET'])
-def get_history():
+async def get_history():
     """Get chat history"""
-    return jsonify({'history': state.chat_history})
+    # Re-encode only after the history has changed
+    if state.history_json is None:
+        state.history_json = orjson.dumps({'history': list(state.chat_history)})
+    return app.response_class(state.history_json, mimetype='application/json')
 
 
 @app.route('/status', methods=['GET'])
-def get_status():
+async def get_status():
     """Get connection status"""
-    return jsonify({
-        'connected': len(state.connected_servers) > 0,
-        'connected_servers': state.connected_servers,
-        'total_servers': len(state.server_configs),
-        'tools_count': len(state.available_tools)
-    })
+    # Re-encode only when the status has changed since the last poll
+    key = (tuple(state.connected_servers), len(state.server_configs), len(state.available_tools))
+    if state.status_json[0] != key:
+        state.status_json = (key, orjson.dumps({
+            'connected': len(state.connected_servers) > 0,
+            'connected_servers': state.connected_servers,
+            'total_servers': len(state.server_configs),
+            'tools_count': len(state.available_tools)
+        }))
+    return app.response_class(state.status_json[1], mimetype='application/json')
 
 
 @app.route('/logs', methods=['GET'])
-def get_logs():
-    """Get all logs"""
-    return jsonify({'logs': state.logs})
+async def get_logs():
+    """Get all logs, or only those after the ?since=<id> cursor"""
+    since = request.args.get('since', 0, type=int)
+    body = b'{"logs":[' + b','.join(entry.json for entry in state.logs_since(since)) + b']}'
+    return app.response_class(body, mimetype='application/json')
+
+
+def sse_event(entry: LogEntry) -> bytes:
+    """Encode a log entry as a Server-Sent Event carrying its id"""
+    return b'id: %d\ndata: %b\n\n' % (entry.id, entry.json)
+
+
+@app.route('/logs/stream', methods=['GET'])
+async def stream_logs():
+    """Stream log entries as Server-Sent Events
+
+    Entries after the ?since=<id> cursor, or after Last-Event-ID when the
+    browser reconnects, are replayed first; then new entries follow as they
+    are logged.
+    """
+    queue = asyncio.Queue(maxsize=1000)
+    state.log_subscribers.add(queue)
+
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    backlog = state.logs_since(since) if since is not None else []
+    last_sent = backlog[-1].id if backlog else since or 0
+
+    async def events():
+        try:
+            for entry in backlog:
+                yield sse_event(entry)
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                if entry.id > last_sent:  # Skip entries already in the backlog
+                    yield sse_event(entry)
+        finally:
+            state.log_subscribers.discard(queue)
+
+    response = await make_response(events(), {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache'
+    })
+    response.timeout = None  # The stream stays open until the client goes away
+    return response
 
 
 @app.route('/logs/clear', methods=['POST'])
-def clear_logs():
+async def clear_logs():
     """Clear all logs"""
-    state.logs = []
-    return jsonify({'status': 'success', 'message': 'Logs cleared'})
+    state.logs.clear()
+    return ojsonify({'status': 'success', 'message': 'Logs cleared'})
+
+
+async def serve_until_signalled(config: HypercornConfig):
+    """Serve the app until SIGINT or SIGTERM, then shut down gracefully
+
+    Open /logs/stream responses are ended first so Hypercorn can finish them
+    instead of cancelling them from under itself.
+    """
+    stop = asyncio.Event()
+
+    def shutdown():
+        state.close_log_streams()
+        stop.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, shutdown)
+        except NotImplementedError:  # Windows; Ctrl+C raises KeyboardInterrupt instead
+            pass
+    await serve(app, config, shutdown_trigger=stop.wait)
 
 
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("MCP Client Web Interface")
     print("="*60)
-    print("\nStarting server on http://localhost:5001")
+    port = int(os.environ.get('MCP_WEB_PORT', '5001'))
+    print(f"\nStarting server on http://localhost:{port}")
     print("Open this URL in your web browser to use the client\n")
     print("Press Ctrl+C to stop the server")
     print("="*60 + "\n")
 
-    app.run(debug=True, host='0.0.0.0', port=5001, use_reloader=False)
+    # Serve on libuv's event loop when available
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    if os.environ.get('MCP_DEV') == '1':
+        # Quart's development server, with debug tracebacks
+        app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False)
+    else:
+        # Production ASGI server in a single process, since servers, logs and
+        # history live in this module; equivalent to
+        #   hypercorn mcp_client_web:app -k uvloop -w 1 -b 0.0.0.0:5001
+        config = HypercornConfig()
+        config.bind = [f'0.0.0.0:{port}']
+        try:
+            asyncio.run(serve_until_signalled(config))
+        except KeyboardInterrupt:
+            pass
@@ -5,8 +5,10 @@ A Python server for exposing tools, resources, and prompts via Model Context Pro
 
 import asyncio
 import logging
+import time
 from typing import Any
 import httpx
+import orjson
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
@@ -30,6 +32,42 @@ app = Server("example-server")
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "mcp-server/1.0"
 
+# Shared HTTP client so tool calls reuse connections to the NWS API
+_http_client: httpx.AsyncClient | None = None
+
+# Forecast URL for each (latitude, longitude), rounded to 4 decimals (~11 m).
+# The points-to-grid mapping rarely changes, so repeat lookups skip a round-trip.
+POINTS_CACHE_TTL = 86400.0
+_points_cache: dict[tuple[float, float], tuple[float, str]] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client, creating it on first use.
+
+    Returns:
+        The pooled client for NWS API requests
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60)
+        )
+    return _http_client
+
+
+# Resource listing, built once at import rather than on every request
+_RESOURCES = [
+    Resource(
+        uri=AnyUrl("example://static-resource"),
+        name="Static Example Resource",
+        description="A static example resource",
+        mimeType="text/plain",
+    )
+]
+
 
 @app.list_resources()
 async def handle_list_resources() -> list[Resource]:
@@ -37,14 +75,7 @@ async def handle_list_resources() -> list[Resource]:
     List available resources.
     Resources are data or content that can be read by the client.
     """
-    return [
-        Resource(
-            uri=AnyUrl("example://static-resource"),
-            name="Static Example Resource",
-            description="A static example resource",
-            mimeType="text/plain",
-        )
-    ]
+    return list(_RESOURCES)
 
 
 @app.read_resource()
@@ -64,166 +95,244 @@ async def handle_read_resource(uri: AnyUrl) -> str:
         raise ValueError(f"Unknown resource: {uri}")
 
 
+# Tool definitions, built once at import rather than on every request
+_TOOLS = [
+    Tool(
+        name="get_weather_forecast",
+        description="Get weather forecast for a location using latitude and longitude",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "latitude": {
+                    "type": "number",
+                    "description": "Latitude of the location"
+                },
+                "longitude": {
+                    "type": "number",
+                    "description": "Longitude of the location"
+                }
+            },
+            "required": ["latitude", "longitude"]
+        }
+    ),
+    Tool(
+        name="get_weather_alerts",
+        description="Get active weather alerts for a US state",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "state": {
+                    "type": "string",
+                    "description": "Two-letter US state code (e.g., CA, NY)"
+                }
+            },
+            "required": ["state"]
+        }
+    ),
+    Tool(
+        name="echo",
+        description="Echo back the input message",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "message": {
+                    "type": "string",
+                    "description": "Message to echo back"
+                }
+            },
+            "required": ["message"]
+        }
+    ),
+    Tool(
+        name="add_numbers",
+        description="Add two numbers together",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "a": {
+                    "type": "number",
+                    "description": "First number"
+                },
+                "b": {
+                    "type": "number",
+                    "description": "Second number"
+                }
+            },
+            "required": ["a", "b"]
+        }
+    )
+]
+
+
 @app.list_tools()
 async def handle_list_tools() -> list[Tool]:
     """
     List available tools.
     Tools are functions that can be called by the LLM.
     """
-    return [
-        Tool(
-            name="get_weather_forecast",
-            description="Get weather forecast for a location using latitude and longitude",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "latitude": {
-                        "type": "number",
-                        "description": "Latitude of the location"
-                    },
-                    "longitude": {
-                        "type": "number",
-                        "description": "Longitude of the location"
-                    }
-                },
-                "required": ["latitude", "longitude"]
-            }
-        ),
-        Tool(
-            name="get_weather_alerts",
-            description="Get active weather alerts for a US state",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "state": {
-                        "type": "string",
-                        "description": "Two-letter US state code (e.g., CA, NY)"
-                    }
-                },
-                "required": ["state"]
-            }
-        ),
-        Tool(
-            name="echo",
-            description="Echo back the input message",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "message": {
-                        "type": "string",
-                        "description": "Message to echo back"
-                    }
-                },
-                "required": ["message"]
-            }
-        ),
-        Tool(
-            name="add_numbers",
-            description="Add two numbers together",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "a": {
-                        "type": "number",
-                        "description": "First number"
-                    },
-                    "b": {
-                        "type": "number",
-                        "description": "Second number"
-                    }
-                },
-                "required": ["a", "b"]
-            }
-        )
-    ]
+    return list(_TOOLS)
 
 
-@app.call_tool()
-async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
-    """
-    Handle tool execution.
+async def _tool_echo(arguments: dict[str, Any]) -> list[TextContent]:
+    """Echo back the input message."""
+    message = arguments.get("message", "")
+    return [TextContent(type="text", text=f"Echo: {message}")]
 
-    Args:
-        name: Name of the tool to execute
-        arguments: Tool arguments
 
-    Returns:
-        List of text content results
-    """
-    try:
-        if name == "echo":
-            message = arguments.get("message", "")
-            return [TextContent(type="text", text=f"Echo: {message}")]
+async def _tool_add_numbers(arguments: dict[str, Any]) -> list[TextContent]:
+    """Add two numbers together."""
+    a = arguments.get("a", 0)
+    b = arguments.get("b", 0)
+    result = a + b
+    return [TextContent(type="text", text=f"Result: {result}")]
 
-        elif name == "add_numbers":
-            a = arguments.get("a", 0)
-            b = arguments.get("b", 0)
-            result = a + b
-            return [TextContent(type="text", text=f"Result: {result}")]
 
-        elif name == "get_weather_forecast":
-            latitude = arguments.get("latitude")
-            longitude = arguments.get("longitude")
+async def _tool_weather_forecast(arguments: dict[str, Any]) -> list[TextContent]:
+    """Get the weather forecast for a latitude and longitude."""
+    latitude = arguments.get("latitude")
+    longitude = arguments.get("longitude")
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude are required")
 
-            async with httpx.AsyncClient() as client:
-                # Get grid point data
-                headers = {"User-Agent": USER_AGENT}
-                points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
+    client = get_http_client()
 
-                response = await client.get(points_url, headers=headers, timeout=30.0)
-                response.raise_for_status()
+    # Get grid point data, unless the forecast URL is already known
+    key = (round(latitude, 4), round(longitude, 4))
+    cached = _points_cache.get(key)
+    if cached and time.monotonic() - cached[0] < POINTS_CACHE_TTL:
+        forecast_url = cached[1]
+    else:
+        points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
+
+        response = await client.get(points_url)
+        response.raise_for_status()
+
+        points_data = orjson.loads(response.content)
+        forecast_url = points_data["properties"]["forecast"]
 
-                points_data = response.json()
-                forecast_url = points_data["properties"]["forecast"]
+        # Drop expired entries so the cache only holds locations seen within the TTL
+        now = time.monotonic()
+        for stale in [k for k, (stamp, _) in _points_cache.items() if now - stamp >= POINTS_CACHE_TTL]:
+            del _points_cache[stale]
+        _points_cache[key] = (now, forecast_url)
 
-                # Get forecast
-                forecast_response = await client.get(forecast_url, headers=headers, timeout=30.0)
-                forecast_response.raise_for_status()
+    # Get forecast
+    forecast_response = await client.get(forecast_url)
+    forecast_response.raise_for_status()
 
-                forecast_data = forecast_response.json()
-                periods = forecast_data["properties"]["periods"]
+    forecast_data = orjson.loads(forecast_response.content)
+    periods = forecast_data["properties"]["periods"]
 
-                # Format forecast
-                forecast_text = f"Weather forecast for {latitude}, {longitude}:\n\n"
-                for period in periods[:5]:  # First 5 periods
-                    forecast_text += f"{period['name']}:\n"
-                    forecast_text += f"Temperature: {period['temperature']}°{period['temperatureUnit']}\n"
-                    forecast_text += f"{period['detailedForecast']}\n\n"
+    # Format forecast
+    parts = [f"Weather forecast for {latitude}, {longitude}:\n\n"]
+    parts.extend(
+        f"{period['name']}:\n"
+        f"Temperature: {period['temperature']}°{period['temperatureUnit']}\n"
+        f"{period['detailedForecast']}\n\n"
+        for period in periods[:5]  # First 5 periods
+    )
 
-                return [TextContent(type="text", text=forecast_text)]
+    return [TextContent(type="text", text="".join(parts))]
 
-        elif name == "get_weather_alerts":
-            state = arguments.get("state", "").upper()
 
-            async with httpx.AsyncClient() as client:
-                headers = {"User-Agent": USER_AGENT}
-                alerts_url = f"{NWS_API_BASE}/alerts/active?area={state}"
+async def _tool_weather_alerts(arguments: dict[str, Any]) -> list[TextContent]:
+    """Get active weather alerts for a US state."""
+    state = arguments.get("state", "").upper()
 
-                response = await client.get(alerts_url, headers=headers, timeout=30.0)
-                response.raise_for_status()
+    client = get_http_client()
+    alerts_url = f"{NWS_API_BASE}/alerts/active?area={state}"
 
-                alerts_data = response.json()
-                features = alerts_data.get("features", [])
+    response = await client.get(alerts_url)
+    response.raise_for_status()
 
-                if not features:
-                    return [TextContent(type="text", text=f"No active alerts for {state}")]
+    alerts_data = orjson.loads(response.content)
+    features = alerts_data.get("features", [])
 
-                # Format alerts
-                alerts_text = f"Active weather alerts for {state}:\n\n"
-                for alert in features[:5]:  # First 5 alerts
-                    props = alert["properties"]
-                    alerts_text += f"Event: {props.get('event', 'Unknown')}\n"
-                    alerts_text += f"Severity: {props.get('severity', 'Unknown')}\n"
-                    alerts_text += f"Description: {props.get('headline', 'No description')}\n\n"
+    if not features:
+        return [TextContent(type="text", text=f"No active alerts for {state}")]
+
+    # Format alerts
+    parts = [f"Active weather alerts for {state}:\n\n"]
+    for alert in features[:5]:  # First 5 alerts
+        props = alert["properties"]
+        parts.append(
+            f"Event: {props.get('event', 'Unknown')}\n"
+            f"Severity: {props.get('severity', 'Unknown')}\n"
+            f"Description: {props.get('headline', 'No description')}\n\n"
+        )
 
-                return [TextContent(type="text", text=alerts_text)]
+    return [TextContent(type="text", text="".join(parts))]
+
+
+# Tool name -> implementation
+_TOOL_HANDLERS = {
+    "echo": _tool_echo,
+    "add_numbers": _tool_add_numbers,
+    "get_weather_forecast": _tool_weather_forecast,
+    "get_weather_alerts": _tool_weather_alerts,
+}
+
+
+@app.call_tool()
+async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    """
+    Handle tool execution.
+
+    Args:
+        name: Name of the tool to execute
+        arguments: Tool arguments
 
-        else:
+    Returns:
+        List of text content results
+    """
+    try:
+        handler = _TOOL_HANDLERS.get(name)
+        if handler is None:
             raise ValueError(f"Unknown tool: {name}")
+        return await handler(arguments)
 
     except Exception as e:
         logger.error(f"Error executing tool {name}: {str(e)}")
-        return [TextContent(type="text", text=f"Error: {str(e)}")]
+        # Let the SDK report it as a result with isError set, so clients can tell it from output
+        raise
+
+
+# Prompt definitions, built once at import rather than on every request
+_PROMPTS = [
+    {
+        "name": "analyze_weather",
+        "description": "Analyze weather data and provide insights",
+        "arguments": [
+            {
+                "name": "location",
+                "description": "Location to analyze",
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "math_problem_solver",
+        "description": "Help solve math problems step by step using available tools",
+        "arguments": [
+            {
+                "name": "problem",
+                "description": "The math problem to solve",
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "calculate_total",
+        "description": "Calculate totals and provide breakdown using add_numbers tool",
+        "arguments": [
+            {
+                "name": "items",
+                "description": "List of numbers to sum (comma-separated)",
+                "required": True
+            }
+        ]
+    }
+]
 
 
 @app.list_prompts()
@@ -232,41 +341,7 @@ async def handle_list_prompts() -> list[Any]:
     List available prompts.
     Prompts are pre-written templates for common tasks.
     """
-    return [
-        {
-            "name": "analyze_weather",
-            "description": "Analyze weather data and provide insights",
-            "arguments": [
-                {
-                    "name": "location",
-                    "description": "Location to analyze",
-                    "required": True
-                }
-            ]
-        },
-        {
-            "name": "math_problem_solver",
-            "description": "Help solve math problems step by step using available tools",
-            "arguments": [
-                {
-                    "name": "problem",
-                    "description": "The math problem to solve",
-                    "required": True
-                }
-            ]
-        },
-        {
-            "name": "calculate_total",
-            "description": "Calculate totals and provide breakdown using add_numbers tool",
-            "arguments": [
-                {
-                    "name": "items",
-                    "description": "List of numbers to sum (comma-separated)",
-                    "required": True
-                }
-            ]
-        }
-    ]
+    return list(_PROMPTS)
 
 
 @app.get_prompt()
@@ -331,20 +406,24 @@ async def main():
     """Main entry point for the MCP server"""
     logger.info("Starting MCP server...")
 
-    # Run the server using stdio transport
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="example-server",
-                server_version="1.0.0",
-                capabilities=app.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={}
+    try:
+        # Run the server using stdio transport
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="example-server",
+                    server_version="1.0.0",
+                    capabilities=app.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={}
+                    )
                 )
             )
-        )
+    finally:
+        if _http_client is not None:
+            await _http_client.aclose()
 
 
 if __name__ == "__main__":